@@ -0,0 +1,219 @@
+"""
+Benchmarks of easyinfo's own per-call overhead.
+
+Run with: python -m easyinfo.bench
+Times the printing, naming, timing, saving, and number conversion functions, iterate, and
+TimingCollector.record for values of several sizes and output sinks (or inputs) using compare_time, saves the results with vsave, and compares them
+with a baseline saved by a previous run (--save-baseline).
+
+"""
+from __future__ import print_function
+import argparse
+import io
+import os
+import shutil
+import tempfile
+
+from tabulate import tabulate
+from numpy import mean as np_mean
+from numpy import asarray as np_asarray
+
+from .utils import vprint, lprint, aprint, vname, vstr, start, end, vsave, vload, compare_time, timer
+from .utils import to_int, to_ints, to_num, to_nums, iterate, TimingCollector
+
+default_sizes = [1, 100, 10000]
+default_results_path = 'easyinfo_bench.pkl'
+default_baseline_path = 'easyinfo_bench_baseline.pkl'
+
+# A list that compare_time can name by its size (it uses __name__ for table headers)
+# Holds range(size) unless items are given.
+class BenchValue(list):
+  def __init__(self, size, items=None):
+    super(BenchValue, self).__init__(range(size) if items is None else items)
+    self.__name__ = 'len_'+str(size)
+
+# Functions timed by compare_time for each value. file is the output sink for printing functions.
+def bench_vprint(value, file=None):
+  vprint(value, file=file)
+
+def bench_lprint(value, file=None):
+  lprint(value, file=file)
+
+def bench_aprint(value, file=None):
+  aprint(value, file=file)
+
+def bench_vstr(value, file=None):
+  vstr(value)
+
+def bench_vname(value, file=None):
+  vname(value)
+
+# Scalar conversion of each item compared with batch conversion
+def bench_to_int(value, file=None):
+  [to_int(item) for item in value]
+
+def bench_to_ints(value, file=None):
+  to_ints(value)
+
+def bench_to_num(value, file=None):
+  [to_num(item) for item in value]
+
+def bench_to_nums(value, file=None):
+  to_nums(value)
+
+# A plain loop compared with the same loop through iterate
+def bench_loop(value, file=None):
+  for _ in value:
+    pass
+
+def bench_iterate(value, file=None):
+  for _ in iterate(value, report_every=None, verbose=False):
+    pass
+
+print_functions = [bench_vprint, bench_lprint, bench_aprint]
+other_functions = [bench_vstr, bench_vname]
+int_functions = [bench_to_int, bench_to_ints]
+num_functions = [bench_to_num, bench_to_nums]
+iterate_functions = [bench_loop, bench_iterate]
+
+# Text of size numbers: ints, or decimals if decimal is True.
+# If dirty is True, every 100th item (starting with the first) can't be parsed directly.
+def number_text(size, decimal=False, dirty=False):
+  items = []
+  for i in range(size):
+    if dirty and i % 100 == 0:
+      items.append('N/A' if i % 200 == 0 else str(i)+'kg')
+    elif decimal:
+      items.append(str(i)+'.25')
+    else:
+      items.append(str(i))
+  return items
+
+# Output sinks for printing functions: name -> function to open a file-like object
+def get_sinks(tmp_dir):
+  return {
+    'devnull': lambda: open(os.devnull, 'w'),
+    'stringio': io.StringIO,
+    'file': lambda: open(os.path.join(tmp_dir, 'sink.txt'), 'w'),
+  }
+
+# Rows of [sink, function, size, min sec, avg sec] from a table returned by compare_time
+# For functions that don't print, sink is '-' or describes the input (e.g. 'clean', 'dirty').
+def table_rows(table, sink, sizes):
+  rows = []
+  for func_scores in table[1:]:
+    func_name = func_scores[0].replace('bench_', '')
+    for size_i, size in enumerate(sizes):
+      if size_i == 0:
+        min_i = 1
+      else:
+        min_i = 4 * size_i # Function, baseline min, avg, conclusion, then min, avg, conclusion, p-value
+      rows.append([sink, func_name, size, float(func_scores[min_i]), float(func_scores[min_i + 1])])
+  return rows
+
+# start() and end() can't be timed by compare_time, which uses them itself
+def bench_timer(num_times):
+  times = []
+  for _ in range(num_times):
+    call_start = timer()
+    start()
+    end(verbose=False)
+    times.append(timer() - call_start)
+  times = np_asarray(times)
+  return [['-', 'start_end', 0, float(times.min()), float(np_mean(times))]]
+
+# Time vsave and vload of each value as a pickle
+def bench_save_load(values, sizes, num_times, tmp_dir):
+  filepath = os.path.join(tmp_dir, 'value.pkl')
+  def bench_vsave(value):
+    vsave(value, filepath, verbose=False)
+  def bench_vload(value):
+    vload(filepath, verbose=False)
+  print("vsave")
+  rows = table_rows(compare_time(objects=values, functions=bench_vsave, num_times=num_times), 'pkl', sizes)
+  # vload loads whatever vsave saved last, so each value is saved before timing its load
+  for value, size in zip(values, sizes):
+    vsave(value, filepath, verbose=False)
+    print("vload "+value.__name__)
+    rows.extend(table_rows(compare_time(objects=[value], functions=bench_vload, num_times=num_times), 'pkl', [size]))
+  return rows
+
+# Time to_int/to_num on each item against to_ints/to_nums, on clean and dirty text
+def bench_conversion(sizes, num_times):
+  rows = []
+  for case, dirty in [('clean', False), ('dirty', True)]:
+    for functions, decimal in [(int_functions, False), (num_functions, True)]:
+      values = [BenchValue(size, number_text(size, decimal=decimal, dirty=dirty)) for size in sizes]
+      print("Conversion: "+case)
+      rows.extend(table_rows(compare_time(objects=values, functions=functions, num_times=num_times), case, sizes))
+  return rows
+
+# Time TimingCollector.record once per item of each value, as end() does with a collector attached
+def bench_collector(values, sizes, num_times):
+  with TimingCollector(num_slots=1, max_names=1) as collector:
+    def bench_record(value):
+      for _ in value:
+        collector.record('bench', 0.)
+    print("TimingCollector")
+    return table_rows(compare_time(objects=values, functions=bench_record, num_times=num_times), '-', sizes)
+
+# Run all benchmarks, returning rows of [sink, function, size, min sec, avg sec]
+def run(sizes=default_sizes, num_times=100):
+  values = [BenchValue(size) for size in sizes]
+  rows = []
+  tmp_dir = tempfile.mkdtemp(prefix='easyinfo_bench_')
+  try:
+    for sink, open_sink in get_sinks(tmp_dir).items():
+      sink_file = open_sink()
+      try:
+        print("Sink: "+sink)
+        rows.extend(table_rows(compare_time(objects=values, functions=print_functions, num_times=num_times, file=sink_file), sink, sizes))
+      finally:
+        sink_file.close()
+    print("No output")
+    rows.extend(table_rows(compare_time(objects=values, functions=other_functions, num_times=num_times), '-', sizes))
+    rows.extend(table_rows(compare_time(objects=values, functions=iterate_functions, num_times=num_times), '-', sizes))
+    rows.extend(bench_conversion(sizes, num_times))
+    rows.extend(bench_timer(num_times))
+    rows.extend(bench_collector(values, sizes, num_times))
+    rows.extend(bench_save_load(values, sizes, num_times, tmp_dir))
+  finally:
+    shutil.rmtree(tmp_dir)
+  return rows
+
+# Compare rows with baseline rows by average time
+def compare_baseline(rows, baseline_rows):
+  baseline = {tuple(row[:3]): row[4] for row in baseline_rows}
+  table = []
+  for row in rows:
+    key = tuple(row[:3])
+    if key not in baseline:
+      continue
+    ratio = row[4] / baseline[key] if baseline[key] else float('nan')
+    table.append(list(key) + [baseline[key], row[4], ratio])
+  print("Compared with baseline (ratio < 1 is faster)")
+  print(tabulate(table, headers=['Sink', 'Function', 'Size', 'Baseline Avg Sec', 'Avg Sec', 'Ratio']))
+  print()
+  return table
+
+def main(args=None):
+  parser = argparse.ArgumentParser(description="Benchmark easyinfo's per-call overhead.")
+  parser.add_argument('--num-times', type=int, default=100, help='Calls per function and value')
+  parser.add_argument('--sizes', type=int, nargs='+', default=default_sizes, help='Lengths of values')
+  parser.add_argument('--results', default=default_results_path, help='Where to save results')
+  parser.add_argument('--baseline', default=default_baseline_path, help='Baseline results to compare with')
+  parser.add_argument('--save-baseline', action='store_true', help='Also save results as the baseline')
+  args = parser.parse_args(args)
+
+  rows = run(sizes=args.sizes, num_times=args.num_times)
+  print(tabulate(rows, headers=['Sink', 'Function', 'Size', 'Min Sec', 'Avg Sec']))
+  print()
+  vsave(rows, args.results)
+  if os.path.exists(args.baseline):
+    compare_baseline(rows, vload(args.baseline, verbose=False))
+  if args.save_baseline:
+    vsave(rows, args.baseline)
+  return rows
+
+if __name__ == '__main__':
+  main()
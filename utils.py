@@ -12,6 +12,15 @@ import pickle
 import os
 import subprocess
 import importlib
+import mmap as mmap_module
+import struct
+import gzip
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+import weakref
+from collections import OrderedDict
 
 def imp(package):
     """ Import module by name """
@@ -40,6 +49,23 @@ from numpy import mean as np_mean
 from numpy import asarray as np_asarray
 from numpy.random import randint
 from numpy import isnan
+from numpy import save as np_save
+from numpy import savez as np_savez
+from numpy import savez_compressed as np_savez_compressed
+from numpy import load as np_load
+from numpy import zeros as np_zeros
+from numpy import fromiter as np_fromiter
+from numpy import isfinite as np_isfinite
+from numpy import where as np_where
+from numpy import abs as np_abs
+from numpy import concatenate as np_concatenate
+from numpy import array_split
+from numpy import ones as np_ones
+from numpy import cumsum as np_cumsum
+from numpy import searchsorted as np_searchsorted
+from numpy import frombuffer as np_frombuffer
+from numpy import int64, float64
+from numpy.ma import masked_array
 from random import shuffle
 from scipy.stats import ttest_ind
 import pprint
@@ -49,6 +75,7 @@ import ctypes
 import errno
 from ctypes.util import find_library
 from functools import partial
+from functools import wraps
 
 CLOCK_PROCESS_CPUTIME_ID = 2  # time.h
 CLOCK_MONOTONIC_RAW = 4
@@ -78,10 +105,10 @@ def clock_gettime(clk_id):
     return tp.tv_sec + tp.tv_nsec * 1e-9
 
 try:
-    from time import process_time
+    from time import process_time, perf_counter
 except ImportError:  # Python <3.3
-    # perf_counter = partial(clock_gettime, CLOCK_MONOTONIC_RAW)
-    # perf_counter.__name__ = 'perf_counter'
+    perf_counter = partial(clock_gettime, CLOCK_MONOTONIC_RAW)
+    perf_counter.__name__ = 'perf_counter'
     process_time = partial(clock_gettime, CLOCK_PROCESS_CPUTIME_ID)
     process_time.__name__ = 'process_time'
 
@@ -300,6 +327,324 @@ def add_file_prefix(filename, pre):
   basename = os.path.basename(filename)
   return os.path.join(dirname, str(pre)+"_"+basename)
 
+# Out-of-band pickling (protocol 5, Python 3.8+), used only when asked for.
+# Large buffers (e.g. contiguous numpy arrays) are written raw after the pickle
+#   stream instead of being copied into it, followed by a footer:
+#   [pickle stream][buffers, each aligned to _OOB_ALIGN][(offset, size) per buffer][num buffers][_OOB_MAGIC]
+# Such files can only be loaded by pickle_load, not pickle.load or pd.read_pickle.
+# A plain pickle always ends with the STOP opcode '.', so pickle_load tells them apart by the footer.
+_PICKLE_OOB = pickle.HIGHEST_PROTOCOL >= 5
+_OOB_MAGIC = b'EZOOB5\x00\x01'
+_OOB_ALIGN = 64
+# Compressed pickles are gzip files, recognized by their first bytes
+_GZIP_MAGIC = b'\x1f\x8b'
+_gzip_level = 6
+
+# Pickle obj to an open binary file as an ordinary pickle
+# If out_of_band is True, write array buffers out-of-band if possible, so pickle_load can memory-map them
+# If compress is True, write a gzip-compressed pickle instead (buffers in-band)
+def pickle_dump(obj, bin_file, compress=False, out_of_band=False):
+  if compress:
+    with gzip.GzipFile(fileobj=bin_file, mode='wb', compresslevel=_gzip_level) as gzip_file:
+      pickle.dump(obj, gzip_file, protocol=pickle.HIGHEST_PROTOCOL)
+    return
+  if not out_of_band or not _PICKLE_OOB:
+    pickle.dump(obj, bin_file)
+    return
+  buffers = []
+  pickle.Pickler(bin_file, protocol=5, buffer_callback=buffers.append).dump(obj)
+  if not buffers:
+    return
+  index = []
+  offset = bin_file.tell()
+  for buf in buffers:
+    padding = -offset % _OOB_ALIGN
+    bin_file.write(b'\x00' * padding)
+    offset += padding
+    view = buf.raw()
+    bin_file.write(view)
+    index.append((offset, view.nbytes))
+    offset += view.nbytes
+  for buf_offset, size in index:
+    bin_file.write(struct.pack('<QQ', buf_offset, size))
+  bin_file.write(struct.pack('<Q', len(index)))
+  bin_file.write(_OOB_MAGIC)
+
+# Load a pickle written by pickle_dump (or any ordinary pickle) from an open binary file
+# If mmap is True, out-of-band buffers (see pickle_dump) are memory-mapped (read-only) instead of read,
+#   so arrays are loaded without copying and shared between processes through the page cache.
+def pickle_load(bin_file, mmap=False):
+  if bin_file.read(len(_GZIP_MAGIC)) == _GZIP_MAGIC:
+    bin_file.seek(0)
+    with gzip.GzipFile(fileobj=bin_file, mode='rb') as gzip_file:
+      return pickle.load(gzip_file)
+  footer_size = len(_OOB_MAGIC) + 8
+  bin_file.seek(0, os.SEEK_END)
+  file_size = bin_file.tell()
+  footer = b''
+  if _PICKLE_OOB and file_size >= footer_size:
+    bin_file.seek(-footer_size, os.SEEK_END)
+    footer = bin_file.read(footer_size)
+  bin_file.seek(0)
+  if not footer.endswith(_OOB_MAGIC):
+    return pickle.load(bin_file)
+  num_buffers = struct.unpack('<Q', footer[:8])[0]
+  bin_file.seek(-footer_size - 16 * num_buffers, os.SEEK_END)
+  index_bytes = bin_file.read(16 * num_buffers)
+  index = [struct.unpack_from('<QQ', index_bytes, i * 16) for i in range(num_buffers)]
+  if mmap:
+    file_map = memoryview(mmap_module.mmap(bin_file.fileno(), 0, access=mmap_module.ACCESS_READ))
+    buffers = [file_map[offset:offset + size] for offset, size in index]
+  else:
+    buffers = []
+    for offset, size in index:
+      buf = bytearray(size)
+      bin_file.seek(offset)
+      bin_file.readinto(buf)
+      buffers.append(buf)
+  bin_file.seek(0)
+  return pickle.load(bin_file, buffers=buffers)
+
+# Key of the .npz entry recording what npz_save saved: 'dict', 'list', 'tuple' or 'array'
+_npz_kind_key = '__easyinfo_kind__'
+
+# Save arrays to .npz: a dict is saved by key, a list or tuple as arr_0, arr_1, ...
+def npz_save(obj, filepath, compress=False):
+  savez = np_savez_compressed if compress else np_savez
+  if isinstance(obj, dict):
+    if _npz_kind_key in obj:
+      raise ValueError("Can't save key "+_npz_kind_key+" to .npz: it's reserved")
+    savez(filepath, **dict(obj, **{_npz_kind_key: 'dict'}))
+  elif isinstance(obj, (list, tuple)):
+    kind = 'tuple' if isinstance(obj, tuple) else 'list'
+    savez(filepath, *obj, **{_npz_kind_key: kind})
+  else:
+    savez(filepath, obj, **{_npz_kind_key: 'array'})
+
+# Load .npz as the kind of object npz_save saved (dict, list, tuple or array)
+# Files saved some other way (e.g. np.savez) are loaded as a dict
+def npz_load(filepath):
+  with np_load(filepath, allow_pickle=True) as npz_file:
+    keys = [key for key in npz_file.files if key != _npz_kind_key]
+    kind = 'dict'
+    if _npz_kind_key in npz_file.files:
+      kind = str(npz_file[_npz_kind_key])
+    if kind == 'dict':
+      return {key: npz_file[key] for key in keys}
+    arrays = [npz_file['arr_'+str(i)] for i in range(len(keys))]
+    if kind == 'array':
+      return arrays[0]
+    return tuple(arrays) if kind == 'tuple' else arrays
+
+# Sharded saving and loading
+# A sharded object is a directory of pickles (shard_00000.pkl, ...) written by pickle_dump,
+#   plus a manifest that lists the shards and how to reassemble them.
+_shard_manifest = 'manifest.pkl'
+futures = imp('concurrent.futures') # Python 3, or the futures backport on Python 2
+
+# Is path a directory written by save_shards?
+def is_sharded(path):
+  return os.path.isfile(os.path.join(path, _shard_manifest))
+
+# Split obj into up to num_shards chunks. Lists, tuples, dicts and arrays are split
+#   along their length; anything else is a single shard.
+def split_shards(obj, num_shards):
+  if hasattr(obj, 'shape') and len(obj.shape):
+    kind = 'array'
+    chunks = array_split(obj, min(num_shards, len(obj)) or 1)
+  elif isinstance(obj, (list, tuple)):
+    kind = 'tuple' if isinstance(obj, tuple) else 'list'
+    chunk_size = -(-len(obj) // num_shards) or 1
+    chunks = [obj[i:i + chunk_size] for i in range(0, len(obj), chunk_size)] or [obj]
+  elif isinstance(obj, dict):
+    kind = 'dict'
+    items = list(obj.items())
+    chunk_size = -(-len(items) // num_shards) or 1
+    chunks = [dict(items[i:i + chunk_size]) for i in range(0, len(items), chunk_size)] or [{}]
+  else:
+    kind = 'object'
+    chunks = [obj]
+  return kind, chunks
+
+# Reassemble chunks split by split_shards
+def join_shards(kind, chunks):
+  if kind == 'array':
+    return np_concatenate(chunks)
+  elif kind == 'list' or kind == 'tuple':
+    joined = []
+    for chunk in chunks:
+      joined.extend(chunk)
+    return tuple(joined) if kind == 'tuple' else joined
+  elif kind == 'dict':
+    joined = {}
+    for chunk in chunks:
+      joined.update(chunk)
+    return joined
+  return chunks[0]
+
+def _save_shard(chunk, filepath, compress=False, out_of_band=False):
+  with open(filepath, 'wb') as bin_file:
+    pickle_dump(chunk, bin_file, compress=compress, out_of_band=out_of_band)
+
+def _load_shard(filepath, mmap=False):
+  with open(filepath, 'rb') as bin_file:
+    return pickle_load(bin_file, mmap=mmap)
+
+# Thread pool by default: pickling array buffers, compression and file IO release the GIL.
+# Processes also parallelize pickling of Python objects, but chunks are copied to and from workers.
+def _shard_pool(num_tasks, processes=False):
+  if futures is None:
+    raise ImportError("Sharded saving and loading require concurrent.futures (Python 3)")
+  workers = max(1, min(num_tasks, multiprocessing.cpu_count()))
+  if processes:
+    return futures.ProcessPoolExecutor(max_workers=workers)
+  return futures.ThreadPoolExecutor(max_workers=workers)
+
+# Save obj to directory shard_dir as num_shards pickles, written in parallel
+def save_shards(obj, shard_dir, num_shards, compress=False, processes=False, out_of_band=False):
+  kind, chunks = split_shards(obj, num_shards)
+  os.makedirs(shard_dir, exist_ok=True)
+  manifest_path = os.path.join(shard_dir, _shard_manifest)
+  # Remove the previous manifest before overwriting its shards, so a partially written
+  #   directory isn't loaded
+  if os.path.exists(manifest_path):
+    os.remove(manifest_path)
+  shard_names = ['shard_%05d.pkl' % shard_i for shard_i in range(len(chunks))]
+  with _shard_pool(len(chunks), processes) as pool:
+    list(pool.map(_save_shard, chunks, [os.path.join(shard_dir, name) for name in shard_names],
+      [compress] * len(chunks), [out_of_band] * len(chunks)))
+  manifest = {'kind': kind, 'shards': shard_names, 'lengths': [vlen(chunk) for chunk in chunks]}
+  fd, tmp_manifest_path = tempfile.mkstemp(suffix='.tmp.pkl', dir=shard_dir)
+  os.close(fd)
+  _save_shard(manifest, tmp_manifest_path)
+  os.replace(tmp_manifest_path, manifest_path)
+  for filename in os.listdir(shard_dir): # Remove shards left from a previous save
+    if filename.startswith('shard_') and filename not in shard_names:
+      os.remove(os.path.join(shard_dir, filename))
+  return shard_dir
+
+# Shards of an object saved by save_shards, loaded on demand.
+# shards[i] loads shard i, iterating loads one shard at a time, and load() loads
+#   and reassembles the whole object.
+class Shards(object):
+  def __init__(self, shard_dir, mmap=False):
+    self.shard_dir = shard_dir
+    self.mmap = mmap
+    self.manifest = _load_shard(os.path.join(shard_dir, _shard_manifest))
+    self.kind = self.manifest['kind']
+    self.lengths = self.manifest['lengths']
+
+  def __len__(self):
+    return len(self.manifest['shards'])
+
+  def __getitem__(self, shard_i):
+    return _load_shard(os.path.join(self.shard_dir, self.manifest['shards'][shard_i]), self.mmap)
+
+  def __iter__(self):
+    for shard_i in range(len(self)):
+      yield self[shard_i]
+
+  def __repr__(self):
+    return "Shards('"+self.shard_dir+"', "+str(len(self))+" "+self.kind+" shards)"
+
+  # Load all shards in parallel and reassemble the object
+  def load(self, processes=False):
+    filepaths = [os.path.join(self.shard_dir, name) for name in self.manifest['shards']]
+    with _shard_pool(len(filepaths), processes) as pool:
+      chunks = list(pool.map(_load_shard, filepaths, [self.mmap] * len(filepaths)))
+    return join_shards(self.kind, chunks)
+
+# Buffer size for writing .txt, .csv and .tsv files
+_write_buffer_size = 1 << 20
+
+# Lazily read rows from a .txt (stripped lines), .csv or .tsv (lists of cells) file
+def stream_rows(filepath, ext=None):
+  if ext is None:
+    ext = os.path.splitext(filepath)[1]
+  with open(filepath, 'r') as text_file:
+    if ext == '.txt':
+      for line in text_file:
+        yield line.strip()
+    else:
+      if ext == '.csv':
+        delimiter = ','
+      else:
+        delimiter = '\t'
+      for row in csv.reader(text_file, delimiter=delimiter):
+        yield row
+
+# Group rows from an iterable into lists of up to chunksize rows
+def chunk_rows(rows, chunksize):
+  chunk = []
+  for row in rows:
+    chunk.append(row)
+    if len(chunk) >= chunksize:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+# Number of rows used to infer column types when loading typed columns
+_type_sample_size = 1000
+# Fraction of non-empty sampled cells that must be plain numbers for a column to be numeric
+_numeric_fraction = .5
+
+# Can text be converted by float() directly?
+def _is_float(text):
+  try:
+    float(text)
+    return True
+  except ValueError:
+    return False
+
+# Convert rows (e.g. from csv) to typed columns.
+# Column types are inferred from the first sample_size rows: a column is numeric if more than
+#   _numeric_fraction of the non-empty cells in the sample are plain numbers, so a few dirty
+#   cells (e.g. 'N/A') don't change the type wherever they are in the file.
+#   Numeric columns are converted with to_num semantics into int64 or float64 masked arrays,
+#   with cells that can't be converted masked. Other columns are object arrays of strings.
+# If header is None, the first row is used as a header if none of its cells are numbers
+#   and at least one column is numeric.
+# Returns a dict of column name to array if there is a header, otherwise a list of arrays.
+def typed_columns(rows, header=None, sample_size=None):
+  if sample_size is None:
+    sample_size = _type_sample_size
+  # Append cells to columns row by row instead of keeping all rows and transposing them.
+  #   Each row list is freed right away, so millions of rows don't trigger garbage collector passes.
+  columns = []
+  num_rows = 0
+  for row in rows:
+    if len(row) > len(columns): # Earlier rows are missing these columns
+      columns.extend([''] * num_rows for _ in range(len(row) - len(columns)))
+    elif len(row) < len(columns):
+      row = list(row) + [''] * (len(columns) - len(row))
+    for column, cell in zip(columns, row):
+      column.append(cell)
+    num_rows += 1
+  if not columns:
+    return []
+  numeric = []
+  for column in columns:
+    sample = [cell for cell in column[1:sample_size + 1] if cell != '']
+    num_floats = sum(1 for cell in sample if _is_float(cell))
+    numeric.append(bool(sample) and num_floats > _numeric_fraction * len(sample))
+  if header is None:
+    header = any(numeric) and all(cell != '' and not _is_float(cell) for cell in (column[0] for column in columns))
+  names = None
+  if header:
+    names = [column[0] for column in columns]
+    columns = [column[1:] for column in columns]
+  arrays = []
+  for column_i, column in enumerate(columns):
+    if numeric[column_i]:
+      arrays.append(to_nums(column))
+    else:
+      arrays.append(np_asarray(column, dtype=object))
+    columns[column_i] = None # Free each column of text once converted
+  if names is not None:
+    return dict(zip(names, arrays))
+  return arrays
+
 # Use pickle to save an object
 # If filepath include a filename at end, use that filename
 # If filepath is a directory, save object as filepath/variable_name.pkl
@@ -307,11 +652,25 @@ def add_file_prefix(filename, pre):
 # If no filepath is given, save object as variable_name.pkl in current dir
 # If filepath ends in .txt, save as plain text.
 # If filepath ends in .csv, save as csv.
-# If filepath is just an extension: '.pkl', '.txt' or '.csv', save as that type of file
+#   For .txt and .csv, obj can also be a generator or iterator, which is written
+#   incrementally so that it never needs to be in memory all at once.
+# If filepath ends in .npy, save as a numpy array (np.save).
+# If filepath ends in .npz, save a dict, list, or array of arrays (np.savez).
+# If filepath is just an extension: '.pkl', '.txt', '.csv', '.npy' or '.npz', save as that type of file
 #   using the variable name as file basename
+# Pickles are ordinary pickles, loadable with pickle.load or pd.read_pickle.
+#   If out_of_band is True, numpy array data is stored out-of-band after the pickle (protocol 5)
+#   instead, so it can be memory-mapped by vload(..., mmap=True). Such files need vload to be loaded.
+# If compress is True, pickles are gzip-compressed and .npz uses np.savez_compressed.
+#   vload detects compressed pickles automatically.
+# If shards is given, save a list, tuple, dict or array split into that many pickles,
+#   written in parallel to the directory filepath, used as given even if it has an extension
+#   (or the variable name in the save directory).
+#   processes=True uses a process pool instead of threads.
 global _save_dir
 _save_dir = ''
-def vsave(obj, filepath=None, sort=True, save_dir=None, verbose=True,):
+def vsave(obj, filepath=None, sort=True, save_dir=None, verbose=True, compress=False, shards=None, processes=False,
+    out_of_band=False):
   global _save_dir
   if save_dir:
     if filepath:
@@ -319,6 +678,14 @@ def vsave(obj, filepath=None, sort=True, save_dir=None, verbose=True,):
     _save_dir = save_dir
   var_name = vname(obj, num_back=3, func_name='vsave')
   ext = None
+  if shards:
+    shard_dir = os.path.join(_save_dir, var_name)
+    if filepath and not os.path.basename(filepath).startswith('.'): # Not only an extension
+      shard_dir = filepath # As given, even with an extension, so vload finds it by the same path
+    save_shards(obj, shard_dir, shards, compress=compress, processes=processes, out_of_band=out_of_band)
+    if verbose:
+      print("To load saved variable: "+var_name+" = vload('"+shard_dir+"')")
+    return shard_dir
   if filepath:
     filename, ext = os.path.splitext(filepath)
     if filename.startswith('.'): # If only extension was provided
@@ -328,10 +695,9 @@ def vsave(obj, filepath=None, sort=True, save_dir=None, verbose=True,):
       _save_dir = filename # Save directory for future calls
     elif ext == '.txt':
       filepath = filename + ext
-      with open(filepath, 'w') as txt_file:
-        if isinstance(obj, list):
-          for item in obj:
-            txt_file.write(str(item)+"\n")
+      with open(filepath, 'w', buffering=_write_buffer_size) as txt_file:
+        if isinstance(obj, list) or hasattr(obj, '__next__'): # Lists, generators and iterators
+          txt_file.writelines(str(item)+"\n" for item in obj)
         elif isinstance(obj, dict):
           items = obj.items()
           if sort:
@@ -346,14 +712,22 @@ def vsave(obj, filepath=None, sort=True, save_dir=None, verbose=True,):
         return filepath
     elif ext == '.csv' or ext == '.tsv':
       filepath = filename + ext
-      with open(filepath, 'w') as csv_file:
+      with open(filepath, 'w', buffering=_write_buffer_size) as csv_file:
         if ext == '.csv':
           delimiter = ','
         else:
           delimiter = '\t'
         writer = csv.writer(csv_file, delimiter=delimiter)
-        for row in obj:
-          writer.writerow(row)
+        writer.writerows(obj)
+      if verbose:
+        print("To load saved variable: "+var_name+" = vload('"+filepath+"')")
+      return filepath
+    elif ext == '.npy' or ext == '.npz':
+      filepath = filename + ext
+      if ext == '.npy':
+        np_save(filepath, obj)
+      else:
+        npz_save(obj, filepath, compress=compress)
       if verbose:
         print("To load saved variable: "+var_name+" = vload('"+filepath+"')")
       return filepath
@@ -366,7 +740,7 @@ def vsave(obj, filepath=None, sort=True, save_dir=None, verbose=True,):
     filename = var_name + '.pkl'
     filepath = os.path.join(_save_dir, filename) # Use specified or saved directory
   with open(filepath, 'wb') as bin_file:
-    pickle.dump(obj, bin_file)
+    pickle_dump(obj, bin_file, compress=compress, out_of_band=out_of_band)
   if verbose:
     print("To load saved variable: "+var_name+" = vload('"+filepath+"')")
   return filepath
@@ -376,8 +750,20 @@ def vsave(obj, filepath=None, sort=True, save_dir=None, verbose=True,):
 #   use receiving variable name as filename (e.g. 'test_var.pkl' for test_var = vload())
 # Also, for a filepath with no extension, use it as the directory
 # load_dir can be specified if different than _save_dir
-def vload(filepath=float('inf'), load_dir=None, verbose=True):
+# If mmap is True, .npy files and array data in pickles saved with vsave(..., out_of_band=True)
+#   are memory-mapped (read-only) instead of read into memory.
+# For .txt, .csv and .tsv, if stream is True, return a lazy iterator of rows instead of a list.
+#   If chunksize is given, return a lazy iterator of lists of up to chunksize rows.
+# For .csv and .tsv, if typed is True, return numpy arrays of columns with inferred types
+#   (see typed_columns) instead of rows of strings. header=True or False says whether the first row
+#   is a header of column names, which is otherwise detected.
+# A directory saved with vsave(..., shards=N) is loaded in parallel and reassembled.
+#   If lazy is True, return a Shards object that loads shards on demand instead.
+#   processes=True uses a process pool instead of threads.
+def vload(filepath=float('inf'), load_dir=None, verbose=True, mmap=False, stream=False, chunksize=None, typed=False,
+    header=None, lazy=False, processes=False):
   ext = ''
+  shard_dir = None
   if not load_dir:
     global _save_dir
     load_dir = _save_dir
@@ -390,7 +776,11 @@ def vload(filepath=float('inf'), load_dir=None, verbose=True):
     filepath += ".pkl"
   else:
     filename, ext = os.path.splitext(filepath)
-    if filename.startswith('.'): # If only extension was provided
+    if load_dir and is_sharded(os.path.join(load_dir, filepath)): # Saved with shards, path as returned by vsave
+      shard_dir = os.path.join(load_dir, filepath)
+    elif is_sharded(filepath):
+      shard_dir = filepath
+    elif filename.startswith('.'): # If only extension was provided
       ext = filename
       var_name = vname(filepath, num_back=3, func_name='vload', arg_i=-1)
       filepath = var_name + ext
@@ -400,24 +790,35 @@ def vload(filepath=float('inf'), load_dir=None, verbose=True):
       filepath += ".pkl"
   if load_dir:
     filepath = os.path.join(load_dir, filepath)
-  if ext == '.txt':
-    with open(filepath, 'r') as txt_file:
-      loaded_var = []
-      for line in txt_file:
-        loaded_var.append(line.strip())
-  elif ext == '.csv' or ext == '.tsv':
-    with open(filepath, 'r') as csv_file:
-      if ext == '.csv':
-        delimiter = ','
-      else:
-        delimiter = '\t'
-      reader = csv.reader(csv_file, delimiter=delimiter)
-      loaded_var = []
-      for row in reader:
-        loaded_var.append(row)
+  if shard_dir is None and not ext and not os.path.exists(filepath) and is_sharded(filepath[:-len('.pkl')]):
+    shard_dir = filepath[:-len('.pkl')] # Saved with shards and no filepath
+  if shard_dir is not None:
+    loaded_var = Shards(shard_dir, mmap=mmap)
+    if lazy:
+      if verbose:
+        print("Loading shards on demand from "+shard_dir)
+      return loaded_var
+    loaded_var = loaded_var.load(processes=processes)
+    filepath = shard_dir
+  elif ext == '.txt' or ext == '.csv' or ext == '.tsv':
+    if stream or chunksize:
+      loaded_var = stream_rows(filepath, ext)
+      if chunksize:
+        loaded_var = chunk_rows(loaded_var, chunksize)
+      if verbose:
+        print("Streaming variable from "+filepath)
+      return loaded_var
+    if typed and ext != '.txt':
+      loaded_var = typed_columns(stream_rows(filepath, ext), header=header)
+    else:
+      loaded_var = list(stream_rows(filepath, ext))
+  elif ext == '.npy':
+    loaded_var = np_load(filepath, mmap_mode='r' if mmap else None, allow_pickle=True)
+  elif ext == '.npz':
+    loaded_var = npz_load(filepath)
   else:
     with open(filepath, 'rb') as bin_file:
-      loaded_var = pickle.load(bin_file)
+      loaded_var = pickle_load(bin_file, mmap=mmap)
   if verbose:
     filepath_str = filepath
     if len(filepath_str) > 50:
@@ -427,6 +828,225 @@ def vload(filepath=float('inf'), load_dir=None, verbose=True):
     lprint(loaded_var, "Loaded variable from "+filepath_str)
   return loaded_var
 
+# Disk-backed memoization
+
+# Pickle an object for hashing. Array buffers are hashed directly (out-of-band)
+#   instead of being copied into the pickle.
+# Raises an exception (e.g. pickle.PicklingError, TypeError) if obj can't be pickled.
+def _hash_pickle(hasher, obj):
+  if _PICKLE_OOB:
+    buffers = []
+    hasher.update(pickle.dumps(obj, protocol=5, buffer_callback=buffers.append))
+    for buf in buffers:
+      hasher.update(buf.raw())
+  else:
+    hasher.update(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+# Hash a function's source code, so that cached results are invalidated when it changes.
+# Values the function's results depend on besides its arguments are hashed too:
+#   defaults and closure variables of functions, the arguments of functools.partial objects,
+#   the object of bound methods, and the state of other callable objects (pickled).
+# Returns None if some of them can't be pickled, so that the function isn't cached.
+def _hash_func(func):
+  hasher = hashlib.blake2b(digest_size=16)
+  try:
+    _hash_callable(hasher, func, set())
+  except Exception: # e.g. a closure over an open file
+    return None
+  return hasher
+
+def _hash_callable(hasher, func, seen):
+  if id(func) in seen: # e.g. a nested function that calls itself
+    return
+  seen.add(id(func))
+  if isinstance(func, partial):
+    hasher.update(b'partial')
+    _hash_callable(hasher, func.func, seen)
+    _hash_pickle(hasher, _canonical_args(func.args, func.keywords or {}))
+  elif inspect.ismethod(func):
+    _hash_callable(hasher, func.__func__, seen)
+    _hash_pickle(hasher, func.__self__)
+  elif not (inspect.isfunction(func) or inspect.isbuiltin(func) or inspect.isclass(func)):
+    _hash_callable(hasher, type(func), seen) # A callable object: its class and its state
+    _hash_pickle(hasher, func)
+  else:
+    hasher.update((getattr(func, '__module__', None) or '').encode())
+    hasher.update(getattr(func, '__qualname__', get_name(func)).encode())
+    try:
+      hasher.update(inspect.getsource(func).encode())
+    except (OSError, TypeError): # e.g. defined in an interactive session
+      code = getattr(func, '__code__', None)
+      if code is not None:
+        hasher.update(code.co_code)
+        hasher.update(repr(code.co_consts).encode())
+    if inspect.isfunction(func):
+      _hash_pickle(hasher, _canonical_args(func.__defaults__ or (), func.__kwdefaults__ or {}))
+      for cell in func.__closure__ or ():
+        if inspect.isfunction(cell.cell_contents): # Local functions can't be pickled
+          _hash_callable(hasher, cell.cell_contents, seen)
+        else:
+          _hash_pickle(hasher, _canonical(cell.cell_contents))
+
+# Items of a set, frozenset or dict in a fixed order, pickled differently from a tuple of the same items
+class _CanonicalItems(tuple):
+  pass
+
+# Copy of args and kwargs where sets and frozensets (also inside lists, tuples and dicts)
+#   have their items in a fixed order, since the order they're pickled in can change
+#   between runs (see PYTHONHASHSEED). Sets inside other objects aren't reordered,
+#   so arguments containing them may miss the cache.
+def _canonical_args(args, kwargs):
+  return _canonical(tuple(args)), sorted((key, _canonical(value)) for key, value in kwargs.items())
+
+_canonical_types = {set, frozenset, list, tuple, dict}
+
+def _canonical(obj):
+  obj_type = type(obj)
+  if obj_type is set or obj_type is frozenset:
+    items = sorted(pickle.dumps(_canonical(item), protocol=pickle.HIGHEST_PROTOCOL) for item in obj)
+    return _CanonicalItems([obj_type.__name__] + items)
+  elif obj_type is list or obj_type is tuple:
+    if _canonical_types.isdisjoint(set(map(type, obj))): # Quick check, e.g. for long lists of numbers
+      return obj
+    items = [_canonical(item) for item in obj]
+    if any(item is not orig_item for item, orig_item in zip(items, obj)):
+      return obj_type(items)
+  elif obj_type is dict:
+    if _canonical_types.isdisjoint(set(map(type, obj)) | set(map(type, obj.values()))):
+      return obj
+    items = [(_canonical(key), _canonical(value)) for key, value in obj.items()]
+    if any(key is not orig_key or value is not orig_value
+        for (key, value), (orig_key, orig_value) in zip(items, obj.items())):
+      return _CanonicalItems(['dict'] + items)
+  return obj
+
+# Hash arguments by pickling them (see _hash_pickle), after _canonical_args.
+# Raises an exception (e.g. pickle.PicklingError, TypeError) if arguments can't be pickled.
+def _hash_args(func_hasher, args, kwargs):
+  hasher = func_hasher.copy()
+  _hash_pickle(hasher, _canonical_args(args, kwargs))
+  return hasher.hexdigest()
+
+# Cache files are named <function name>_<32 hex digit key>.pkl
+_cache_file_re = re.compile(r'^(.+)_[0-9a-f]{32}\.pkl$')
+
+# Remove least recently used cache files from cache_dir until their total size is at most max_size
+# Only cache files are counted and removed, so files being written by other processes
+#   (.tmp.pkl) and any other files are left alone. Files removed by other processes in the
+#   meantime are ignored.
+def _evict_cache(cache_dir, max_size):
+  entries = []
+  total_size = 0
+  for filename in os.listdir(cache_dir):
+    if not _cache_file_re.match(filename):
+      continue
+    try:
+      stat = os.stat(os.path.join(cache_dir, filename))
+    except OSError:
+      continue
+    entries.append((stat.st_mtime, stat.st_size, filename))
+    total_size += stat.st_size
+  entries.sort()
+  for _, size, filename in entries:
+    if total_size <= max_size:
+      break
+    try:
+      os.remove(os.path.join(cache_dir, filename))
+    except OSError:
+      pass
+    total_size -= size
+
+# Decorator to cache results of a function on disk, saved like vsave saves pickles.
+# Results are keyed by a hash of the function's source code and its arguments,
+#   so they're reused between runs and recomputed when the function changes.
+# dir: directory to store results in. Defaults to .vcache in the directory set by vsave
+# max_size: maximum total size in bytes of the cache directory. Least recently used results
+#   are removed when it's exceeded.
+# memory_size: number of results also kept in memory (least recently used are dropped)
+# compress: compress results on disk (see vsave)
+# Results are only read back by vcache, so array data is stored out-of-band (see pickle_dump).
+# Results are written to a temporary file and then renamed, so several processes can share
+#   a cache directory. Arguments that can't be pickled skip the cache, and so do all calls of a
+#   function whose closure, defaults or state can't be pickled (see _hash_func).
+# The decorated function has cache_dir and cache_clear(), which removes its cached results.
+# e.g.
+# @vcache(dir='cache', max_size=10**9)
+# def features(data):
+def vcache(dir=None, max_size=None, memory_size=128, compress=False, verbose=False):
+  cache_dir = dir or os.path.join(_save_dir, '.vcache')
+  def decorator(func):
+    func_hasher = _hash_func(func)
+    func_name = get_name(func)
+    memory_cache = OrderedDict()
+    lock = threading.Lock()
+
+    @wraps(func)
+    def cached_func(*args, **kwargs):
+      key = None
+      if func_hasher is not None:
+        try:
+          key = _hash_args(func_hasher, args, kwargs)
+        except Exception: # Arguments can't be pickled
+          pass
+      if key is None:
+        return func(*args, **kwargs)
+      with lock:
+        if key in memory_cache:
+          memory_cache.move_to_end(key)
+          return memory_cache[key]
+      filepath = os.path.join(cache_dir, func_name + '_' + key + '.pkl')
+      loaded = False
+      try:
+        with open(filepath, 'rb') as bin_file:
+          result = pickle_load(bin_file)
+        loaded = True
+        os.utime(filepath, None) # Mark as recently used
+      except Exception: # Not cached, removed by another process, or unreadable
+        pass
+      if loaded:
+        if verbose:
+          print("Loaded cached result of "+get_name(func)+" from "+filepath)
+      else:
+        result = func(*args, **kwargs)
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_filepath = tempfile.mkstemp(suffix='.tmp.pkl', dir=cache_dir)
+        try:
+          with os.fdopen(fd, 'wb') as bin_file:
+            pickle_dump(result, bin_file, compress=compress, out_of_band=True)
+          os.replace(tmp_filepath, filepath)
+        except Exception: # e.g. result can't be pickled
+          os.remove(tmp_filepath)
+          if verbose:
+            print("Couldn't save result of "+get_name(func)+" to "+filepath)
+        else:
+          if verbose:
+            print("Saved result of "+get_name(func)+" to "+filepath)
+          if max_size is not None:
+            _evict_cache(cache_dir, max_size)
+      if memory_size:
+        with lock:
+          memory_cache[key] = result
+          if len(memory_cache) > memory_size:
+            memory_cache.popitem(last=False)
+      return result
+
+    def cache_clear():
+      with lock:
+        memory_cache.clear()
+      if os.path.isdir(cache_dir):
+        for filename in os.listdir(cache_dir):
+          cache_file = _cache_file_re.match(filename)
+          if cache_file and cache_file.group(1) == func_name:
+            try:
+              os.remove(os.path.join(cache_dir, filename))
+            except OSError:
+              pass
+
+    cached_func.cache_dir = cache_dir
+    cached_func.cache_clear = cache_clear
+    return cached_func
+  return decorator
+
 
 # Get name of function, class, or variable
 def get_name(obj):
@@ -466,6 +1086,9 @@ def start(id=None):
 
 # msg: message to print before time. If only id is provided, 
 # use id for msg. If neither is provided, use "Total time"
+# If a TimingCollector is attached and msg is given, the time is also recorded to it under msg.
+#   Calls without msg (e.g. in compare_time) aren't recorded. A time that can't be recorded
+#   (e.g. no free slots) is dropped and counted instead of raising.
 # id: 
 def end(msg=None, verbose=True):
   end_time = timer()
@@ -475,6 +1098,11 @@ def end(msg=None, verbose=True):
     since_time = end_time - _last_time
   except TypeError:
     since_time = total_time
+  if _collector is not None and msg:
+    try:
+      _collector.record(msg, since_time)
+    except ValueError:
+      _collector._drop()
   if verbose:
     if not msg:
       msg = 'Total time'
@@ -487,6 +1115,315 @@ def end(msg=None, verbose=True):
   _last_time = timer()
   return since_time
 
+# Percentiles reported for per-item times
+_report_percents = [50, 90, 99]
+_report_headers = ['Name', 'Count', 'Total Sec', 'Avg Sec', 'Per Sec'] + \
+  ['p'+str(percent)+' Sec' for percent in _report_percents]
+
+# Percentiles of values, where each value is counted weights[i] times
+def weighted_percentiles(values, weights=None, percents=_report_percents):
+  values = np_asarray(values, dtype=float64)
+  if not len(values):
+    return [float('nan')] * len(percents)
+  if weights is None:
+    weights = np_ones(len(values))
+  order = values.argsort()
+  values = values[order]
+  cum_weights = np_cumsum(np_asarray(weights, dtype=float64)[order])
+  positions = np_asarray(percents, dtype=float64) / 100 * cum_weights[-1]
+  indices = np_searchsorted(cum_weights, positions).clip(0, len(values) - 1)
+  return list(values[indices])
+
+# Row of a timing report: count items took total_time seconds,
+#   with per-item times (optionally weighted) for percentiles
+def timing_row(name, count, total_time, times=(), weights=None):
+  avg_time = total_time / count if count else float('nan')
+  per_sec = count / total_time if total_time > 0 else float('nan')
+  return [name, count, total_time, avg_time, per_sec] + weighted_percentiles(times, weights)
+
+# Print a table of timing rows, in the format of compare_time
+# Returns the table, with headers as the first row. Other keyword arguments are passed to print.
+def timing_report(rows, title='Timing report', verbose=True, **kwargs):
+  if verbose:
+    msg = title+"\n"
+    msg += tabulate(rows, headers=_report_headers)
+    msg += "\n"
+    print(msg, **kwargs)
+  return [_report_headers] + list(rows)
+
+# Seconds between clock checks in iterate
+_iterate_check_time = .01
+
+# Wrap an iterable to measure throughput, like a progress meter.
+# Every report_every seconds, print items done, items per second, and the ETA
+#   if the length is known (from vlen, or total). report_every=None disables these.
+# When iteration ends (or stops early), print a timing_report of the number of items,
+#   items per second and per-item time percentiles, unless verbose is False.
+# The clock is checked only every K items, with K adapted to the time per item so that
+#   checks happen about every _iterate_check_time seconds. Per-item percentiles are therefore
+#   of the average time per item between checks.
+# Times are wall-clock (perf_counter), so they include time spent waiting, e.g. on IO.
+# Other keyword arguments are passed to print (e.g. file=sys.stderr), also for the timing_report.
+# e.g.
+# for row in iterate(rows):
+def iterate(iterable, name=None, total=None, report_every=1.0, verbose=True, **kwargs):
+  if name is None:
+    name = vname(iterable, num_back=3, func_name='iterate')
+    if not name or not all(part.isidentifier() for part in name.split('.')): # e.g. iterate([1, 2])
+      name = get_name(iterable)
+  if total is None and (hasattr(iterable, '__len__') or hasattr(iterable, 'shape')):
+    total = vlen(iterable)
+  return _iterate(iterable, name, total, report_every, verbose, kwargs)
+
+def _iterate(iterable, name, total, report_every, verbose, print_kwargs):
+  check_every = 1
+  countdown = 1
+  count = 0 # Items before the last clock check
+  times = [] # Average time per item between clock checks
+  weights = [] # Number of items between clock checks
+  start_time = last_time = last_report = perf_counter()
+  try:
+    for item in iterable:
+      countdown -= 1 # Before yielding, so an item the loop breaks on is counted
+      yield item
+      if countdown:
+        continue
+      now = perf_counter()
+      check_time = now - last_time
+      count += check_every
+      times.append(check_time / check_every)
+      weights.append(check_every)
+      last_time = now
+      # Aim for _iterate_check_time between checks, growing at most 2x at a time
+      if check_time > 0:
+        check_every = max(1, min(int(check_every * _iterate_check_time / check_time), check_every * 2))
+      else:
+        check_every *= 2
+      countdown = check_every
+      if report_every is not None and now - last_report >= report_every:
+        last_report = now
+        per_sec = count / (now - start_time)
+        msg = str(name)+": "+str(count)
+        if total:
+          msg += "/"+str(total)+" ("+str(round(100. * count / total, 1))+"%)"
+        msg += " items, "+str(round(per_sec, 1))+" items/sec"
+        if total and per_sec > 0:
+          msg += ", ETA "+str(round((total - count) / per_sec, 1))+" sec"
+        print(msg, **print_kwargs)
+  finally:
+    end_time = perf_counter()
+    remaining = check_every - countdown # Items since the last clock check
+    if remaining:
+      count += remaining
+      times.append((end_time - last_time) / remaining)
+      weights.append(remaining)
+    if verbose:
+      timing_report([timing_row(name, count, end_time - start_time, times, weights)], title='Iteration timing',
+        **print_kwargs)
+
+# Cross-process timing
+
+shared_memory = imp('multiprocessing.shared_memory') # Python 3.8+
+
+# Collector attached in this process, which end() records timings to
+_collector = None
+# All collectors in this process, so that forked children stop using their parent's slots
+_collectors = weakref.WeakSet()
+
+# Collect timings from several processes (e.g. a multiprocessing Pool) in shared memory.
+# Each process claims its own slot the first time it records, so recording takes no locks.
+#   Slots of processes that have exited are claimed again (e.g. by replacement Pool workers),
+#   keeping the times they recorded.
+# A slot holds the count and total time of each name (exact), and the last capacity samples
+#   (used for percentiles).
+# Times that end() can't record, because all slots are in use or there are more than max_names
+#   names, are dropped and counted (see dropped()) so that the work being timed isn't interrupted.
+# e.g.
+# collector = TimingCollector()
+# with Pool(4, initializer=collector.attach) as pool:
+#   pool.map(work, items) # work calls start() and end('step', verbose=False) as usual
+# collector.report()
+# collector.close()
+# Or record times directly with collector.record(name, seconds).
+# Recording from several threads of one process is not supported.
+# context: multiprocessing context of the processes (e.g. multiprocessing.get_context('spawn'))
+class TimingCollector(object):
+  _name_size = 64 # Bytes per name (longer names are truncated)
+
+  def __init__(self, num_slots=64, max_names=64, capacity=10000, context=None):
+    if shared_memory is None:
+      raise ImportError("TimingCollector requires multiprocessing.shared_memory (Python 3.8+)")
+    self.num_slots = num_slots
+    self.max_names = max_names
+    self.capacity = capacity
+    # Slot layout: header (pid, number of names, number of samples), name counts, name totals,
+    #   sample times, sample name indices, names
+    self._slot_size = 8 * 3 + 8 * max_names * 2 + 8 * capacity + 4 * capacity + self._name_size * max_names
+    self._slot_size += -self._slot_size % 8
+    # Slots follow a header holding the number of dropped samples
+    self._shm = shared_memory.SharedMemory(create=True, size=8 + self._slot_size * num_slots)
+    self._owner = True
+    self._lock = (context or multiprocessing).Lock() # Only used to claim slots
+    self._slot = None
+    _collectors.add(self)
+
+  # Shared to processes by name, e.g. as a Pool initializer argument
+  def __getstate__(self):
+    return {'num_slots': self.num_slots, 'max_names': self.max_names, 'capacity': self.capacity,
+      '_slot_size': self._slot_size, '_lock': self._lock, 'shm_name': self._shm.name}
+
+  def __setstate__(self, state):
+    shm_name = state.pop('shm_name')
+    self.__dict__.update(state)
+    self._shm = shared_memory.SharedMemory(name=shm_name)
+    self._owner = False
+    self._slot = None
+    _collectors.add(self)
+
+  # Typed views of slot_i: header, counts, totals, sample times, sample name indices, names
+  def _slot_views(self, slot_i):
+    slot = self._shm.buf[8 + slot_i * self._slot_size:8 + (slot_i + 1) * self._slot_size]
+    sizes = [(8 * 3, 'q'), (8 * self.max_names, 'q'), (8 * self.max_names, 'd'),
+      (8 * self.capacity, 'd'), (4 * self.capacity, 'i'), (self._name_size * self.max_names, 'B')]
+    views = []
+    offset = 0
+    for size, fmt in sizes:
+      views.append(slot[offset:offset + size].cast(fmt))
+      offset += size
+    return views
+
+  # Claim a free slot for this process, or the slot of a process that has exited
+  def _claim_slot(self):
+    pid = os.getpid()
+    with self._lock:
+      for slot_i in range(self.num_slots):
+        header = self._slot_views(slot_i)[0]
+        if header[0] == 0 or header[0] == pid or not _pid_alive(header[0]):
+          header[0] = pid
+          break
+      else:
+        raise ValueError("No free TimingCollector slots: num_slots="+str(self.num_slots))
+    self._header, self._counts, self._totals, self._times, self._time_names, self._names = self._slot_views(slot_i)
+    # Continue after the names and samples recorded by a previous owner
+    self._name_ids = {self._slot_name(self._names, name_i): name_i for name_i in range(self._header[1])}
+    self._num_samples = self._header[2]
+    self._slot = slot_i
+
+  def _slot_name(self, names, name_i):
+    return bytes(names[name_i * self._name_size:(name_i + 1) * self._name_size]).rstrip(b'\x00').decode('utf-8', 'replace')
+
+  # Count a sample that couldn't be recorded
+  def _drop(self):
+    with self._lock:
+      dropped = self._shm.buf[:8].cast('q')
+      dropped[0] += 1
+      dropped.release()
+
+  # Number of samples end() couldn't record, in all processes
+  def dropped(self):
+    dropped = self._shm.buf[:8].cast('q')
+    num_dropped = dropped[0]
+    dropped.release()
+    return num_dropped
+
+  def _add_name(self, name):
+    name_i = self._header[1]
+    if name_i >= self.max_names:
+      raise ValueError("Too many TimingCollector names: max_names="+str(self.max_names))
+    name_bytes = str(name).encode('utf-8')[:self._name_size]
+    self._names[name_i * self._name_size:name_i * self._name_size + len(name_bytes)] = name_bytes
+    self._header[1] = name_i + 1
+    self._name_ids[name] = name_i
+    return name_i
+
+  # Record that name took seconds in this process
+  def record(self, name, seconds):
+    if self._slot is None:
+      self._claim_slot()
+    name_i = self._name_ids.get(name)
+    if name_i is None:
+      name_i = self._add_name(name)
+    sample_i = self._num_samples % self.capacity
+    self._times[sample_i] = seconds
+    self._time_names[sample_i] = name_i
+    self._counts[name_i] += 1
+    self._totals[name_i] += seconds
+    self._num_samples += 1
+    self._header[2] = self._num_samples
+
+  # Make end() in this process record to this collector (e.g. as a Pool initializer)
+  def attach(self):
+    global _collector
+    _collector = self
+
+  # Merge timings from all processes into one row per name (see timing_row)
+  def rows(self):
+    counts = OrderedDict()
+    totals = {}
+    times = {}
+    for slot_i in range(self.num_slots):
+      header, slot_counts, slot_totals, slot_times, slot_time_names, slot_names = self._slot_views(slot_i)
+      if header[0] == 0:
+        continue
+      num_names = header[1]
+      num_samples = min(header[2], self.capacity)
+      sample_times = np_frombuffer(slot_times, dtype=float64)[:num_samples]
+      sample_names = np_frombuffer(slot_time_names, dtype='i4')[:num_samples]
+      for name_i in range(num_names):
+        name = self._slot_name(slot_names, name_i)
+        counts[name] = counts.get(name, 0) + slot_counts[name_i]
+        totals[name] = totals.get(name, 0) + slot_totals[name_i]
+        times.setdefault(name, []).append(sample_times[sample_names == name_i])
+    return [timing_row(name, counts[name], totals[name], np_concatenate(times[name])) for name in counts]
+
+  # Print and return a timing_report of all processes
+  def report(self, title='Timing report', verbose=True):
+    num_dropped = self.dropped()
+    if num_dropped:
+      title += " ("+str(num_dropped)+" samples dropped)"
+    return timing_report(self.rows(), title=title, verbose=verbose)
+
+  # Stop using shared memory. The process that created the collector also frees it.
+  def close(self):
+    global _collector
+    if _collector is self:
+      _collector = None
+    self._slot = None
+    self._header = self._counts = self._totals = self._times = self._time_names = self._names = None
+    self._shm.close()
+    if self._owner:
+      self._shm.unlink()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+# Is the process with pid running? Zombies (exited but not yet waited for) aren't.
+def _pid_alive(pid):
+  if os.name == 'nt': # os.kill would terminate the process
+    return True
+  try:
+    os.kill(pid, 0)
+  except ProcessLookupError:
+    return False
+  except PermissionError: # Running as another user
+    return True
+  try:
+    with open('/proc/'+str(pid)+'/stat') as stat_file:
+      return stat_file.read().rsplit(')', 1)[-1].split()[0] != 'Z'
+  except (OSError, IndexError): # No /proc, e.g. macOS
+    return True
+
+# A forked child must claim its own slot instead of writing to its parent's
+def _reset_collector_slot():
+  for collector in list(_collectors):
+    collector._slot = None
+
+if hasattr(os, 'register_at_fork'):
+  os.register_at_fork(after_in_child=_reset_collector_slot)
+
 # Get random order of selection for a given number of indices (num_objects)
 def random_order(num_objects, num_times):
   rands = []
@@ -615,6 +1552,9 @@ def compare_time(objects=None, functions=[], num_times=1000, filepath=None, **kw
 
   return t_test_table
 
+# Chars removed from text that can't be converted to a number directly
+_non_num_re = re.compile(r'[^\d.\-]')
+
 # Return an int, removing any non-digit chars other than . or -
 def to_int(text):
   if isinstance(text, int):
@@ -623,11 +1563,7 @@ def to_int(text):
     text = int(text)
     return text
   except ValueError:
-    text = str(text)
-    text_digits = ""
-    for c in text:
-      if c.isdigit() or c == '.' or c == '-':
-        text_digits += c
+    text_digits = _non_num_re.sub('', str(text))
     if text_digits:
       try:
         return int(text_digits)
@@ -647,22 +1583,133 @@ def to_num(text):
       return text_int
     return text_float
   except ValueError:
-    text = str(text)
-    text_digits = ""
-    for c in text:
-      if c.isdigit() or c == '.' or c == '-':
-        text_digits += c
+    text_digits = _non_num_re.sub('', str(text))
     if text_digits:
       try:
         return int(text_digits)
       except ValueError:
         try:
-          score = float(score)
+          return float(text_digits)
         except ValueError:
-          pass
-        return False
+          return False
     else:
       return False
+
+# Number of values converted at once by _num_array
+_num_block_size = 4096
+# Blocks that can't be cast at once are split in half down to this size to isolate dirty values
+_num_min_block_size = 32
+
+# Ints that fit in int64
+_int64_min = -2 ** 63
+_int64_max = 2 ** 63 - 1
+
+# Convert a block of values with to_int or to_num semantics, one value at a time
+# With to_int, ints too big for int64 fail. With to_num, they make the block float64.
+def _num_block_slow(block, as_int):
+  convert = to_int if as_int else to_num
+  values = []
+  failed = []
+  for value in block:
+    try:
+      num = convert(value)
+    except (TypeError, ValueError, OverflowError):
+      num = False
+    if as_int and num is not False and not _int64_min <= num <= _int64_max:
+      num = False
+    failed.append(num is False)
+    values.append(0 if num is False else num)
+  if any(isinstance(num, float) for num in values):
+    return np_asarray(values, dtype=float64), np_asarray(failed, dtype=bool)
+  try:
+    return np_asarray(values, dtype=int64), np_asarray(failed, dtype=bool)
+  except OverflowError:
+    return np_asarray(values, dtype=float64), np_asarray(failed, dtype=bool)
+
+# Convert a block of text to numbers, parsing the whole block at once when it's clean
+# float() and to_num only differ for exponents ('1e5' is 15 for to_num), nan and inf,
+#   so those are left to _num_block_slow.
+def _num_block(block, as_int):
+  try:
+    if not as_int:
+      text = '\n'.join(block) # Only text can be parsed at once for to_num, since int(3.5) truncates
+    try:
+      return np_fromiter(map(int, block), dtype=int64, count=len(block)), np_zeros(len(block), dtype=bool)
+    except (ValueError, OverflowError):
+      if not as_int:
+        if 'e' not in text and 'E' not in text:
+          nums = np_fromiter(map(float, block), dtype=float64, count=len(block))
+          if np_isfinite(nums).all():
+            return nums, np_zeros(len(block), dtype=bool)
+  except (TypeError, ValueError, OverflowError):
+    pass
+  if len(block) > _num_min_block_size:
+    half = len(block) // 2
+    first, first_failed = _num_block(block[:half], as_int)
+    second, second_failed = _num_block(block[half:], as_int)
+    return np_concatenate([first, second]), np_concatenate([first_failed, second_failed])
+  return _num_block_slow(block, as_int)
+
+# Convert a float array with to_int or to_num semantics: nan and inf fail,
+#   to_int truncates, and to_num gives ints if every value is a whole number.
+def _float_num_array(values, as_int):
+  failed = ~np_isfinite(values)
+  nums = np_where(failed, 0, values)
+  if len(nums) and np_abs(nums).max() >= 2 ** 63:
+    return _num_block_slow(values.tolist(), as_int) # Ints too big for int64
+  ints = nums.astype(int64)
+  if as_int or (ints == nums).all():
+    return ints, failed
+  return nums.astype(float64), failed
+
+# Convert an int, unsigned int or bool array to int64.
+# Unsigned ints too big for int64 fail with to_int, and make the array float64 with to_num.
+def _int_num_array(values, as_int):
+  if values.dtype.kind == 'u' and len(values) and values.max() > _int64_max:
+    too_big = values > _int64_max
+    if as_int:
+      return np_where(too_big, 0, values).astype(int64), too_big
+    return values.astype(float64), np_zeros(len(values), dtype=bool)
+  return values.astype(int64), np_zeros(len(values), dtype=bool)
+
+# Convert a sequence of values to a numpy array with to_int (as_int=True) or to_num semantics.
+# Returns (array, failed), where failed is a boolean array marking values that couldn't be
+#   converted (0 in array). The array is int64 unless some value converts to a float,
+#   or (with to_num) is an int too big for int64.
+def _num_array(values, as_int=False):
+  if not hasattr(values, 'dtype') and len(values) and not isinstance(values[0], str):
+    nums = np_asarray(values)
+    if nums.dtype.kind in 'iubf': # Only numbers, e.g. a list of floats
+      values = nums
+  if hasattr(values, 'dtype') and values.dtype.kind in 'iub':
+    return _int_num_array(np_asarray(values), as_int)
+  if hasattr(values, 'dtype') and values.dtype.kind == 'f':
+    return _float_num_array(values, as_int)
+  blocks = []
+  failed_blocks = []
+  for block_start in range(0, len(values), _num_block_size):
+    block, failed = _num_block(values[block_start:block_start + _num_block_size], as_int)
+    blocks.append(block)
+    failed_blocks.append(failed)
+  if not blocks:
+    return np_asarray([], dtype=int64), np_zeros(0, dtype=bool)
+  return np_concatenate(blocks), np_concatenate(failed_blocks)
+
+# Convert a list or array of values with to_int, returning an int64 masked array.
+# Values that to_int can't convert (or that would raise, e.g. None) are masked,
+#   as are ints too big for int64. Bools become 0 and 1.
+# Clean text and numeric arrays are converted without calling to_int for each value.
+def to_ints(values):
+  nums, failed = _num_array(values, as_int=True)
+  return masked_array(nums, mask=failed)
+
+# Convert a list or array of values with to_num, returning a masked array.
+# The array is int64 if every value is an int that fits in int64, otherwise float64
+#   (so ints too big for int64 lose precision). Bools become 0 and 1.
+# Values that to_num can't convert (or that would raise, e.g. None) are masked.
+def to_nums(values):
+  nums, failed = _num_array(values)
+  return masked_array(nums, mask=failed)
 #   minutes = int(minutes)
 #   hours=(millis/(1000*60*60))%24
 